@@ -8,7 +8,8 @@ from src.extractors.vpc_extractor import VPCExtractor
 from src.extractors.ec2_extractor import EC2Extractor
 from src.report_generator import ReportGenerator
 
-def run_analysis(client_name, aws_access_key_id, aws_secret_access_key, region_name):
+def run_analysis(client_name, aws_access_key_id, aws_secret_access_key, region_name,
+                 collect_utilization=False, lookback_days=14, sharded=False):
     """
     Função principal que orquestra a análise para um cliente.
     """
@@ -29,7 +30,7 @@ def run_analysis(client_name, aws_access_key_id, aws_secret_access_key, region_n
         extractors = [
             IAMExtractor(), 
             VPCExtractor(),
-            EC2Extractor() 
+            EC2Extractor(collect_utilization=collect_utilization, lookback_days=lookback_days, sharded=sharded)
         ]
         all_extracted_data = {}
 
@@ -79,6 +80,22 @@ if __name__ == "__main__":
             print("\nERRO: Todos os campos (cliente, chaves e região) são obrigatórios.")
             sys.exit(1)
 
+        # Etapa opcional: métricas de utilização do CloudWatch (CPU, rede e EBS)
+        utilization_input = input("Coletar métricas de utilização do CloudWatch? (s/N): ")
+        collect_utilization = utilization_input.strip().lower() in ('s', 'sim', 'y', 'yes')
+        lookback_days = 14
+        if collect_utilization:
+            lookback_input = input("Quantos dias considerar nas métricas? (padrão: 14): ")
+            if lookback_input.strip():
+                if not lookback_input.strip().isdigit() or int(lookback_input) < 1:
+                    print("\nERRO: O número de dias deve ser um inteiro positivo.")
+                    sys.exit(1)
+                lookback_days = int(lookback_input)
+
+        # Para contas com dezenas de milhares de instâncias: pagina o EC2 em paralelo por AZ
+        sharded_input = input("Usar paginação paralela do EC2 (contas muito grandes)? (s/N): ")
+        sharded = sharded_input.strip().lower() in ('s', 'sim', 'y', 'yes')
+
         # Cria a estrutura de pastas para o cliente
         os.makedirs(os.path.join('clients', client_name_input, 'output'), exist_ok=True)
         
@@ -87,7 +104,10 @@ if __name__ == "__main__":
             client_name=client_name_input,
             aws_access_key_id=access_key_input,
             aws_secret_access_key=secret_key_input,
-            region_name=region_input
+            region_name=region_input,
+            collect_utilization=collect_utilization,
+            lookback_days=lookback_days,
+            sharded=sharded
         )
 
     except KeyboardInterrupt:
@@ -1,12 +1,53 @@
 # src/extractors/ec2_extractor.py
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
 from .base_extractor import BaseExtractor
 
+# Limite de consultas por chamada do CloudWatch GetMetricData
+MAX_METRIC_QUERIES_PER_REQUEST = 500
+
+# Métricas coletadas por recurso: (coluna no relatório, namespace, métrica, estatística)
+INSTANCE_METRICS = [
+    ('CPUAvg (%)', 'AWS/EC2', 'CPUUtilization', 'Average'),
+    ('CPUMax (%)', 'AWS/EC2', 'CPUUtilization', 'Maximum'),
+    ('NetworkIn (GiB)', 'AWS/EC2', 'NetworkIn', 'Sum'),
+    ('NetworkOut (GiB)', 'AWS/EC2', 'NetworkOut', 'Sum'),
+]
+VOLUME_METRICS = [
+    ('ReadOps', 'AWS/EBS', 'VolumeReadOps', 'Sum'),
+    ('WriteOps', 'AWS/EBS', 'VolumeWriteOps', 'Sum'),
+]
+
 class EC2Extractor(BaseExtractor):
     """
     Extrai informações detalhadas dos recursos do EC2 e serviços relacionados.
     Esta versão foi expandida para incluir um grande número de atributos por instância.
+    Opcionalmente, adiciona métricas de utilização do CloudWatch às abas de
+    instâncias e volumes, e pode paginar as consultas em paralelo (modo sharded)
+    para contas com inventários muito grandes.
     """
+    def __init__(self, collect_utilization=False, lookback_days=14,
+                 sharded=False, shard_by='availability-zone', max_workers=8):
+        """
+        :param collect_utilization: Se True, coleta CPU, rede e operações de EBS no CloudWatch.
+        :param lookback_days: Janela (em dias) considerada para as métricas de utilização.
+        :param sharded: Se True, divide as consultas de instâncias, volumes e status
+                        por filtros do lado do servidor e pagina os shards em paralelo.
+        :param shard_by: 'availability-zone', 'vpc-id' ou 'subnet-id'. Volumes e status
+                         não aceitam filtro por VPC/subnet e são sempre divididos por AZ.
+        :param max_workers: Número máximo de shards paginados simultaneamente.
+        """
+        if shard_by not in ('availability-zone', 'vpc-id', 'subnet-id'):
+            raise ValueError(f"shard_by inválido: {shard_by}")
+        self.collect_utilization = collect_utilization
+        self.lookback_days = lookback_days
+        self.sharded = sharded
+        self.shard_by = shard_by
+        self.max_workers = max_workers
+        self._shard_cache = {}
+
     def extract(self, aws_session):
         ec2_client = aws_session.client('ec2')
         elbv2_client = aws_session.client('elbv2')
@@ -19,9 +60,15 @@ class EC2Extractor(BaseExtractor):
             instance_statuses = self._get_instance_statuses(ec2_client)
             elastic_ips = self._get_elastic_ips(ec2_client)
 
+            instances = self._get_instances(ec2_client, instance_statuses, elastic_ips)
+            volumes = self._get_volumes(ec2_client)
+
+            if self.collect_utilization:
+                self._add_utilization(aws_session.client('cloudwatch'), instances, volumes)
+
             ec2_data = {
-                'EC2_Instances_Detailed': self._get_instances(ec2_client, instance_statuses, elastic_ips),
-                'EBS_Volumes': self._get_volumes(ec2_client),
+                'EC2_Instances_Detailed': instances,
+                'EBS_Volumes': volumes,
                 'Elastic_IPs': elastic_ips, # A aba de EIPs continua útil
                 'AMIs': self._get_images(ec2_client),
                 'LoadBalancers': self._get_load_balancers(elbv2_client),
@@ -36,8 +83,8 @@ class EC2Extractor(BaseExtractor):
     def _get_instance_statuses(self, client):
         print("  - Coletando Status Checks das instâncias...")
         statuses = {}
-        paginator = client.get_paginator('describe_instance_status')
-        for page in paginator.paginate(IncludeAllInstances=True):
+        pages = self._paginate(client, 'describe_instance_status', 'availability-zone', IncludeAllInstances=True)
+        for page in pages:
             for status in page['InstanceStatuses']:
                 statuses[status['InstanceId']] = {
                     "SystemStatus": status['SystemStatus']['Status'],
@@ -45,18 +92,66 @@ class EC2Extractor(BaseExtractor):
                 }
         return statuses
 
+    def _paginate(self, client, operation, shard_filter, Filters=None, **kwargs):
+        """
+        Retorna as páginas de uma operação paginada do EC2.
+        No modo sharded, a consulta é dividida em shards pelo filtro informado
+        (ex: uma consulta por AZ) e os shards são paginados em paralelo.
+        Um recurso pode aparecer em mais de um shard; cabe ao chamador deduplicar.
+        """
+        filters = Filters or []
+        paginator = client.get_paginator(operation)
+        if not self.sharded:
+            if filters:
+                kwargs['Filters'] = filters
+            return list(paginator.paginate(**kwargs))
+
+        shards = self._get_shard_values(client, shard_filter)
+
+        def paginate_shard(value):
+            shard_filters = filters + [{'Name': shard_filter, 'Values': [value]}]
+            return list(paginator.paginate(Filters=shard_filters, **kwargs))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            shard_pages = list(executor.map(paginate_shard, shards))
+        return [page for pages in shard_pages for page in pages]
+
+    def _get_shard_values(self, client, shard_filter):
+        """
+        Descobre os valores usados para dividir as consultas (AZs, VPCs ou subnets).
+        O resultado é guardado para que as três consultas reaproveitem a descoberta.
+        """
+        cache = self._shard_cache
+        if shard_filter not in cache:
+            if shard_filter == 'availability-zone':
+                zones = client.describe_availability_zones()['AvailabilityZones']
+                cache[shard_filter] = [zone['ZoneName'] for zone in zones]
+            elif shard_filter == 'vpc-id':
+                paginator = client.get_paginator('describe_vpcs')
+                cache[shard_filter] = [vpc['VpcId'] for page in paginator.paginate() for vpc in page['Vpcs']]
+            else:
+                paginator = client.get_paginator('describe_subnets')
+                cache[shard_filter] = [subnet['SubnetId'] for page in paginator.paginate() for subnet in page['Subnets']]
+            print(f"    Modo sharded: {len(cache[shard_filter])} shards por '{shard_filter}'.")
+        return cache[shard_filter]
+
     def _get_instances(self, client, instance_statuses, elastic_ips):
         print("  - Coletando informações detalhadas de Instâncias EC2...")
-        paginator = client.get_paginator('describe_instances')
         instances_detailed = []
+        seen_instance_ids = set()
         
         # Cria um mapa de InstanceId para Elastic IP para consulta rápida
         eip_map = {eip['AssociatedInstanceId']: eip['PublicIp'] for eip in elastic_ips if eip.get('AssociatedInstanceId')}
 
-        for page in paginator.paginate(Filters=[{'Name': 'instance-state-name', 'Values': ['pending', 'running', 'shutting-down', 'stopping', 'stopped']}]):
+        state_filter = [{'Name': 'instance-state-name', 'Values': ['pending', 'running', 'shutting-down', 'stopping', 'stopped']}]
+        for page in self._paginate(client, 'describe_instances', self.shard_by, Filters=state_filter):
             for reservation in page['Reservations']:
                 for instance in reservation['Instances']:
                     instance_id = instance['InstanceId']
+                    # No modo sharded a mesma instância pode vir de mais de um shard
+                    if instance_id in seen_instance_ids:
+                        continue
+                    seen_instance_ids.add(instance_id)
                     status_check = instance_statuses.get(instance_id, {})
                     iam_profile = instance.get('IamInstanceProfile', {})
                     placement = instance.get('Placement', {})
@@ -113,12 +208,90 @@ class EC2Extractor(BaseExtractor):
                     instances_detailed.append(details)
         return instances_detailed
 
+    def _add_utilization(self, cloudwatch_client, instances, volumes):
+        """
+        Junta as métricas de utilização às linhas de instâncias e volumes,
+        usando InstanceId/VolumeId como chave.
+        Uma falha aqui não deve invalidar o restante da extração do EC2.
+        """
+        print(f"  - Coletando métricas de utilização do CloudWatch (últimos {self.lookback_days} dias)...")
+        try:
+            for rows, id_key, dimension, metrics in (
+                (instances, 'InstanceId', 'InstanceId', INSTANCE_METRICS),
+                (volumes, 'VolumeId', 'VolumeId', VOLUME_METRICS),
+            ):
+                values = self._get_utilization(cloudwatch_client, [row[id_key] for row in rows], dimension, metrics)
+                for row in rows:
+                    for column, _, _, _ in metrics:
+                        row[column] = values.get((row[id_key], column), 'N/A')
+        except Exception as e:
+            print(f"    AVISO: não foi possível coletar as métricas de utilização: {e}")
+
+    def _get_utilization(self, client, resource_ids, dimension, metrics):
+        """
+        Consulta as métricas de vários recursos com GetMetricData, agrupando até
+        500 consultas por chamada em vez de uma chamada por recurso.
+
+        :return: Dicionário {(id_do_recurso, coluna): valor agregado na janela}.
+        """
+        end_time = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        start_time = end_time - timedelta(days=self.lookback_days)
+
+        queries = []
+        query_map = {}
+        for resource_id in resource_ids:
+            for column, namespace, metric_name, stat in metrics:
+                # O Id da consulta precisa começar com letra minúscula
+                query_id = f"m{len(queries)}"
+                query_map[query_id] = (resource_id, column, stat)
+                queries.append({
+                    'Id': query_id,
+                    'MetricStat': {
+                        'Metric': {
+                            'Namespace': namespace,
+                            'MetricName': metric_name,
+                            'Dimensions': [{'Name': dimension, 'Value': resource_id}],
+                        },
+                        'Period': 86400,
+                        'Stat': stat,
+                    },
+                    'ReturnData': True,
+                })
+
+        datapoints = {}
+        paginator = client.get_paginator('get_metric_data')
+        for i in range(0, len(queries), MAX_METRIC_QUERIES_PER_REQUEST):
+            batch = queries[i:i + MAX_METRIC_QUERIES_PER_REQUEST]
+            for page in paginator.paginate(MetricDataQueries=batch, StartTime=start_time, EndTime=end_time):
+                for result in page['MetricDataResults']:
+                    datapoints.setdefault(result['Id'], []).extend(result['Values'])
+
+        values = {}
+        for query_id, (resource_id, column, stat) in query_map.items():
+            points = datapoints.get(query_id)
+            if not points:
+                continue
+            if stat == 'Average':
+                value = sum(points) / len(points)
+            elif stat == 'Maximum':
+                value = max(points)
+            else:
+                value = sum(points)
+            if column.endswith('(GiB)'):
+                value = value / (1024 ** 3)
+            values[(resource_id, column)] = round(value, 2)
+        return values
+
     # As funções abaixo (_get_volumes, _get_elastic_ips, etc.) continuam as mesmas da versão anterior.
     # Elas ainda são úteis para criar suas próprias abas dedicadas no relatório.
     def _get_volumes(self, client):
         print("  - Coletando informações de Volumes EBS...")
-        # ... (código inalterado)
-        volumes = client.describe_volumes()['Volumes']
+        if self.sharded:
+            pages = self._paginate(client, 'describe_volumes', 'availability-zone')
+            # Deduplica por VolumeId, já que os shards podem se sobrepor
+            volumes = list({volume['VolumeId']: volume for page in pages for volume in page['Volumes']}.values())
+        else:
+            volumes = client.describe_volumes()['Volumes']
         result = []
         for volume in volumes:
             name_tag = next((tag['Value'] for tag in volume.get('Tags', []) if tag['Key'] == 'Name'), 'N/A')